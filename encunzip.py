@@ -8,7 +8,7 @@ INFO
        encunzip.py - simple script to list & extract zip/rar file with encodings.
 
 SYNOPSIS
-       python3 encunzip.py OPERATION ENCODING file.zip OUTPUTDIR OPERATION ARG
+       python3 encunzip.py OPERATION ENCODING file.zip OUTPUTDIR [OPTIONS]
 
        you can set encunzip.py to an executable file and use:
        ./encunzip.py OPERATION ENCODING file.zip OUTPUTDIR
@@ -36,10 +36,6 @@ ARGUMENTS
                     Extracted filename's encoding will be the one specified by ENCODING.
                     "OUTPUTDIR" option is required for this operation.
 
-           p        Apply password to zipfile, this OPERATION must be add to the end of command.
-                    You also need to supply a password after it.
-                    After the password, you also need to supply the encoding of password.
-
        ENCODING     common encodings listing in ENCODING TABLE or other encodings like utf-8.
 
            Pick any name from ENCODING TABLE:
@@ -55,7 +51,15 @@ ARGUMENTS
 
 OPTIONAL ARGUMENTS
 
-           -noencerr        Ignore encoding & decoding error during operation
+           --password PWD   Apply password PWD to the archive. (also -p PWD)
+
+           --pwdenc ENC     Encoding of the password, any name from ENCODING TABLE
+                            or other encodings. (default utf-8)
+
+           --noencerr       Ignore encoding & decoding error during operation
+
+           --jobs N         Extract N files in parallel.
+                            Use 0 to pick the machine's cpu count. (default 1)
 
 EXAMPLES:
 
@@ -69,16 +73,39 @@ EXAMPLES:
                python3 encunzip.py x chinese file.zip output
 
            Extract contents in "file.zip" with password "1234" with chinese_1
-               python3 encunzip.py e jp file.zip output p 1234 ch1
+               python3 encunzip.py e jp file.zip output --password 1234 --pwdenc ch1
 
            Extract contents in "file.zip" with password "1234" with chinese_1 ignoring any encoding & decoding error
-               python3 encunzip.py e jp file.zip output p 1234 ch1 -noencerr
+               python3 encunzip.py e jp file.zip output --password 1234 --pwdenc ch1 --noencerr
 
 """
 
-from sys import argv
+import threading
+from sys import argv, stdout
+from argparse import ArgumentParser
+from os import cpu_count, makedirs, sep
+from os.path import dirname
 from pathlib import Path
-from shutil import copyfileobj
+from codecs import getdecoder
+from functools import lru_cache
+from struct import unpack
+from zipfile import ZipFile, ZIP_STORED
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+try:
+    from rarfile import RarFile
+except ImportError:
+    RarFile = None
+
+try:
+    from os import sendfile
+except ImportError: # not available on Windows
+    sendfile = None
+
+try:
+    from os import posix_fallocate
+except ImportError: # not available on Windows
+    posix_fallocate = None
 
 
 ENCODING_TABLE = {
@@ -98,135 +125,246 @@ FILEHEADERS = {
     b'\x52\x61\x72\x21\x1A\x07\x01\x00' : 'rar', # rar_5
 }
 
+# every supported magic sits at file offset 0,
+# so detection only ever needs the longest header's worth of bytes
+MAXHEADERLEN = max(len(header) for header in FILEHEADERS)
+
+
+# 1 MiB copy buffer, large enough to drain most members in one read
+COPY_BUFSIZE = 1024 * 1024
+
+# number of output lines buffered before a single stdout write
+PRINT_BATCH = 64
+
+
+# write buffered output lines to stdout in one call,
+# one flush per batch instead of one syscall per entry
+def flushlines(lines):
+    if lines:
+        stdout.write('\n'.join(lines) + '\n')
+        stdout.flush()
+        lines.clear()
+
+
+# reserve the full output size upfront so the filesystem can allocate
+# contiguous extents instead of growing the file write by write
+def preallocate(target, size):
+    if posix_fallocate is not None and size > 0:
+        try:
+            posix_fallocate(target.fileno(), 0, size)
+        except OSError: # filesystem may not support it
+            pass
+
+
+# copy source into target through a caller-owned buffer,
+# avoiding a fresh bytes allocation per chunk
+def copyitem(source, target, buf):
+    view = memoryview(buf)
+    while True:
+        n = source.readinto(buf)
+        if not n:
+            break
+        target.write(view[:n])
+
+
+# copy a stored (uncompressed) zip entry kernel-to-kernel with sendfile,
+# skipping the user-space copy entirely;
+# returns False when the entry must go through the normal extract path
+def copystored(zfile, info, outitem):
+    if (sendfile is None
+        or not isinstance(zfile, ZipFile)
+        or info.compress_type != ZIP_STORED
+        or info.flag_bits & 0x1): # encrypted
+        return False
+    fp = zfile.fp
+    try:
+        src_fd = fp.fileno()
+    except (AttributeError, OSError):
+        return False
+    # the local file header may carry different name/extra lengths than
+    # the central directory, read them to find where the data starts
+    fp.seek(info.header_offset + 26)
+    namelen, extralen = unpack('<HH', fp.read(4))
+    offset = info.header_offset + 30 + namelen + extralen
+    remaining = info.file_size
+    try:
+        with open(outitem, "wb") as target:
+            preallocate(target, remaining)
+            while remaining > 0:
+                sent = sendfile(target.fileno(), src_fd, offset, remaining)
+                if sent == 0:
+                    break
+                offset += sent
+                remaining -= sent
+    except OSError:
+        return False
+    return remaining == 0
 
-def loadarchive(infile):
-    
-    def read_file_chunk(fd, chunk_size=1024):
-        'lazy reading a file'
-        while True:
-            data = fd.read(chunk_size)
-            if not data:
-                break
-            yield data
-    
-    libname = None
+
+# detect archive type from the leading magic bytes,
+# memoized so repeated calls on the same file skip the open entirely
+@lru_cache(maxsize=8)
+def detectarchive(infile):
     with open(infile, 'rb') as file:
-        exit_loop = False
-        for chunk in read_file_chunk(file):
-            for header,name in FILEHEADERS.items():
-                if header in chunk:
-                    libname = name
-                    exit_loop = True
-                    break
-            if exit_loop:
-                break
+        head = file.read(MAXHEADERLEN)
+    for header,name in FILEHEADERS.items():
+        if head.startswith(header):
+            return name
+    return None
+
+
+# decode all archive filenames from cp437 to the target encoding in one
+# batch, crossing the codec boundary once instead of once per entry;
+# the \x01 sentinel byte never appears in zip/rar filenames
+def decodenames(infos, encoding, ignore_encode_err=False):
+    if not infos:
+        return []
+    # resolve the codec once, bytes.decode(encoding) would go through
+    # the codec registry on every call
+    decode = getdecoder(encoding)
+    try:
+        joined = b'\x01'.join(info.filename.encode('cp437') for info in infos)
+        return decode(joined)[0].split('\x01')
+    except (UnicodeDecodeError, UnicodeEncodeError):
+        if not ignore_encode_err:
+            raise
+    # batch decode failed & errors are ignored,
+    # retry entry by entry so only the offending names stay raw
+    decoded = []
+    for info in infos:
+        try:
+            decoded.append(decode(info.filename.encode('cp437'))[0])
+        except (UnicodeDecodeError, UnicodeEncodeError):
+            decoded.append(info.filename)
+    return decoded
+
+
+def loadarchive(infile):
+    libname = detectarchive(str(infile))
     if libname is None:
         raise Exception('Failed to load archive, file header check failed.')
-    
-    # load necessary library
-    try:
-        if libname == 'zip':
-            from zipfile import ZipFile
-            return ZipFile
-        elif libname == 'rar':
-            from rarfile import RarFile
-            return RarFile
-    except Exception as err:
-        print(f'Failed to load library. {err}')
+
+    # pick necessary library
+    if libname == 'zip':
+        return ZipFile
+    elif libname == 'rar':
+        if RarFile is None:
+            raise Exception('Failed to load library. rarfile is not installed.')
+        return RarFile
+
+# shared skeleton of the list & extract operations: open the archive
+# once, batch-decode the names, then either print them (path_builder is
+# None) or run the pre-pass + worker pool; path_builder maps a decoded
+# entry name to its output path string
+def walkarchive(infile, encoding, path_builder=None, pwd=None,
+                keep_dirs=False, ignore_encode_err=False, jobs=1):
+    archive = loadarchive(infile)
+    with archive(infile) as zip:
+        infos = zip.infolist()
+        names = decodenames(infos, encoding, ignore_encode_err)
+        if path_builder is None: # list only
+            flushlines(names)
+            return
+        # pre-pass: build output paths, create directories & collect
+        # extraction tasks, summing total size on the way so the archive
+        # is only parsed once and worker threads never race on mkdir
+        size = sum(info.file_size for info in infos if not info.is_dir())
+        current_size = 0
+        tasks = []
+        lines = []
+        # many entries share a parent, only issue one mkdir per unique dir
+        created = set()
+        # zip marks directories with a trailing slash, test that directly;
+        # rar keeps the flag elsewhere so fall back to its is_dir()
+        iszip = archive is ZipFile
+        for idx, info in enumerate(infos):
+            outitem = path_builder(names[idx])
+            if keep_dirs:
+                parent = dirname(outitem)
+                if parent not in created:
+                    makedirs(parent, exist_ok=True)
+                    created.add(parent)
+            isdir = info.filename.endswith('/') if iszip else info.is_dir()
+            if not isdir: # is file
+                tasks.append((info, outitem))
+            else:
+                if keep_dirs:
+                    makedirs(outitem, exist_ok=True)
+                    created.add(outitem.rstrip(sep))
+                current_size += info.file_size
+                lines.append(f'{genPerc(current_size, size)} {outitem}')
+                if len(lines) >= PRINT_BATCH:
+                    flushlines(lines)
+        extracttasks(archive, infile, tasks, size, current_size, lines, pwd, jobs)
+
 
 # list zip file content
 # unzip -l
 def enclszip(infile, encoding, ignore_encode_err=False):
-    
-    # setup/check input & output
-    infile = Path(infile)
-    if not infile.exists():
-        raise Exception(f"Cannot find input file: {infile}")
-    
-    # unzip file
-    archive = loadarchive(infile)
-    with archive(infile) as zip:
-        for info in zip.infolist():
-            try:
-                item = info.filename.encode('cp437').decode(encoding)
-            except (UnicodeDecodeError, UnicodeEncodeError):
-                if not ignore_encode_err:
-                    raise
-                item = info.filename
-            print(item)
+    walkarchive(infile, encoding, ignore_encode_err=ignore_encode_err)
+
+# extract a list of (info, outitem) tasks with a thread pool
+# each worker thread opens its own archive handle,
+# decompression releases the GIL so threads scale with cores
+def extracttasks(archive, infile, tasks, size, current_size, lines, pwd=None, jobs=1):
+    lock = threading.Lock()
+    local = threading.local()
+    handles = []
+
+    def extract_one(task):
+        nonlocal current_size
+        info, outitem = task
+        zfile = getattr(local, 'zfile', None)
+        if zfile is None:
+            zfile = local.zfile = archive(infile)
+            local.buf = bytearray(COPY_BUFSIZE)
+            with lock:
+                handles.append(zfile)
+        if not copystored(zfile, info, outitem):
+            source = zfile.open(info.filename, pwd=pwd)
+            target = open(outitem, "wb", buffering=COPY_BUFSIZE)
+            with source, target:
+                preallocate(target, info.file_size)
+                copyitem(source, target, local.buf)
+        with lock:
+            current_size += info.file_size
+            lines.append(f'{genPerc(current_size, size)} {outitem}')
+            if len(lines) >= PRINT_BATCH:
+                flushlines(lines)
+
+    if jobs is None or jobs < 1:
+        jobs = cpu_count()
+    try:
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            # feed the pool through a bounded window of in-flight tasks,
+            # map() would queue a future per entry upfront
+            pending = set()
+            for task in tasks:
+                if len(pending) >= jobs * 4:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        future.result()
+                pending.add(pool.submit(extract_one, task))
+            for future in pending:
+                future.result()
+    finally:
+        for zfile in handles:
+            zfile.close()
+        flushlines(lines)
 
 # unzip without file structure
 # unzip -e
-def encunzipe(infile, encoding, outfile, pwd=None, ignore_encode_err=False):
-    
-    # setup/check input & output
-    infile = Path(infile)
-    if not infile.exists():
-        raise Exception(f"Cannot find input file: {infile}")
-    
-    outfile = Path(outfile)
-    if not outfile.exists():
-        raise Exception(f"Cannot find output directory: {outfile}")
-    
-    size = zipSize(infile)
-    current_size = 0
-    
-    # unzip file
-    archive = loadarchive(infile)
-    with archive(infile) as zip:
-        for info in zip.infolist():
-            filename = info.filename
-            try:
-                outitem = outfile/filename[filename.rfind('/')+1:].encode('cp437').decode(encoding)
-            except (UnicodeDecodeError, UnicodeEncodeError):
-                if not ignore_encode_err:
-                    raise
-                outitem = outfile/filename[filename.rfind('/')+1:]
-            current_size += info.file_size
-            print(genPerc(current_size, size), outitem)
-            if not info.is_dir(): # is file
-                source = zip.open(filename, pwd=pwd)
-                target = open(outitem, "wb")
-                with source, target:
-                    copyfileobj(source, target)
+def encunzipe(infile, encoding, outfile, pwd=None, ignore_encode_err=False, jobs=1):
+    out_dir = str(outfile) + sep
+    walkarchive(infile, encoding, lambda name: out_dir + name.rpartition('/')[2],
+                pwd, False, ignore_encode_err, jobs)
 
 # unzip keeping file structure
 # unzip -x
-def encunzipx(infile, encoding, outfile, pwd=None, ignore_encode_err=False):
-    
-    # setup/check input & output
-    infile = Path(infile)
-    if not infile.exists():
-        raise Exception(f"Cannot find input file: {infile}")
-    
-    outfile = Path(outfile)
-    if not outfile.exists():
-        raise Exception(f"Cannot find output directory: {outfile}")
-    
-    size = zipSize(infile)
-    current_size = 0
-    
-    # unzip file
-    archive = loadarchive(infile)
-    with archive(infile) as zip:
-        for info in zip.infolist():
-            filename = info.filename
-            try:
-                outitem = outfile/filename.encode('cp437').decode(encoding)
-            except (UnicodeDecodeError, UnicodeEncodeError):
-                if not ignore_encode_err:
-                    raise
-                outitem = outfile/filename
-            outitem.parent.mkdir(parents=True, exist_ok=True)
-            current_size += info.file_size
-            print(genPerc(current_size, size), outitem)
-            if not info.is_dir(): # is file
-                source = zip.open(filename, pwd=pwd)
-                target = open(outitem, "wb")
-                with source, target:
-                    copyfileobj(source, target)
-            else:
-                outitem.mkdir(parents=True, exist_ok=True)
+def encunzipx(infile, encoding, outfile, pwd=None, ignore_encode_err=False, jobs=1):
+    out_dir = str(outfile) + sep
+    walkarchive(infile, encoding, lambda name: out_dir + name,
+                pwd, True, ignore_encode_err, jobs)
 
 def getEnc(enc) -> str:
     if enc in ENCODING_TABLE:
@@ -234,13 +372,8 @@ def getEnc(enc) -> str:
     return enc
 
 def genPerc(current_size, ttl_size) -> str:
-    perc = ((current_size / ttl_size) * 100)
-    int_part = int(perc)
-    float_part = round((perc - int_part), 2)
-    int_part = str(int_part).rjust(3, ' ')
-    float_part = str(float_part)[2:].ljust(2, '0')
-    perc = int_part + '.' + float_part + ' %'
-    return perc
+    int_part, float_part = divmod(current_size * 10000 // ttl_size, 100)
+    return f'{int_part:3d}.{float_part:02d} %'
 
 def zipSize(infile):
     size = 0
@@ -249,76 +382,57 @@ def zipSize(infile):
         size = sum([info.file_size for info in zip.infolist() if not info.is_dir()])
     return size
 
+def buildparser():
+    parser = ArgumentParser(prog='encunzip.py', add_help=False)
+    subparsers = parser.add_subparsers(dest='operation')
+    for operation in ('l', 'e', 'x'):
+        sub = subparsers.add_parser(operation, add_help=False)
+        sub.add_argument('encoding')
+        sub.add_argument('infile')
+        if operation != 'l':
+            sub.add_argument('outdir')
+            sub.add_argument('--password', '-p', default=None)
+            sub.add_argument('--pwdenc', default='utf-8')
+            sub.add_argument('--jobs', type=int, default=1)
+        sub.add_argument('--noencerr', action='store_true')
+    return parser
+
+
 def help():
     print(MSG, end='')
 
 
 if __name__ == '__main__':
-    
+
     try:
-        
-        if len(argv) < 4:
+
+        if len(argv) < 2 or argv[1] in ('-h', '--help', 'help'):
             help()
             exit()
-        
-        
-        argv_len = len(argv)
-        cursor = 1
-        operation = argv[cursor]
-        cursor += 1
-        
+
+        args = buildparser().parse_args()
+        encoding = getEnc(args.encoding)
+
+        # check input once here, the workers below can assume it exists
+        infile = Path(args.infile)
+        if not infile.exists():
+            raise Exception(f"Cannot find input file: {infile}")
+
         # list zip file
-        if operation == 'l':
-            encoding = getEnc(argv[cursor])
-            cursor += 1
-            infile = argv[cursor]
-            cursor += 1
-            ignore_encode_err = False
-            if cursor < argv_len and argv[cursor] == '-noencerr':
-                ignore_encode_err = True
-            enclszip(infile, encoding, ignore_encode_err)
-        
-        elif operation == 'e':
-            encoding = getEnc(argv[cursor])
-            cursor += 1
-            infile = argv[cursor]
-            cursor += 1
-            outpath = Path(argv[cursor])
-            cursor += 1
-            password = None
-            if cursor < argv_len and argv[cursor] == 'p':
-                pwdencode = getEnc(argv[cursor+2])
-                password = argv[cursor+1].encode(pwdencode)
-            if not outpath.exists(): outpath.mkdir()
-            ignore_encode_err = False
-            if cursor < argv_len and argv[cursor] == '-noencerr':
-                ignore_encode_err = True
-            encunzipe(infile, encoding, outpath, password, ignore_encode_err)
-        
-        # unzip to a folder with original file structure
-        elif operation == 'x':
-            encoding = getEnc(argv[cursor])
-            cursor += 1
-            infile = argv[cursor]
-            cursor += 1
-            outpath = Path(argv[cursor])
-            cursor += 1
+        if args.operation == 'l':
+            enclszip(infile, encoding, args.noencerr)
+
+        # unzip flat or with original file structure
+        else:
             password = None
-            if cursor < argv_len and argv[cursor] == 'p':
-                pwdencode = getEnc(argv[cursor+2])
-                password = argv[cursor+1].encode(pwdencode)
+            if args.password is not None:
+                password = args.password.encode(getEnc(args.pwdenc))
+            outpath = Path(args.outdir)
             if not outpath.exists(): outpath.mkdir()
-            ignore_encode_err = False
-            if cursor < argv_len and argv[cursor] == '-noencerr':
-                ignore_encode_err = True
-            encunzipx(infile, encoding, outpath, password, ignore_encode_err)
-        
-        else:
-            help()
-        
+            unzip = encunzipe if args.operation == 'e' else encunzipx
+            unzip(infile, encoding, outpath, password, args.noencerr, args.jobs)
+
     except KeyboardInterrupt:
         print()
         exit(-1)
-    except IndexError:
-        pass
 